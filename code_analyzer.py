@@ -1,10 +1,1117 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
+import ast
+import builtins
+import difflib
+import heapq
+import itertools
 import json
+import multiprocessing
 import os
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from tkinter import filedialog, simpledialog
 import requests
 from typing import Optional
 
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+
+# Классы приоритета заданий (меньше — важнее)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITY_SPECULATIVE = 2
+
+# Грубая оценка размера промпта: ~4 символа на токен
+CHARS_PER_TOKEN = 4
+# Резерв токенов под ответ модели при предварительной оценке
+COMPLETION_TOKENS_RESERVE = 1024
+
+DEFAULT_TOKENS_PER_MINUTE = 40000
+DEFAULT_TOKENS_PER_DAY = 2000000
+
+AUTOFIX_MODE = "🩹 Автоисправление (патчи)"
+# Сколько раз отклонённые хунки отправляются модели повторно
+AUTOFIX_RETRIES = 2
+
+ERROR_BODY_LIMIT = 64 * 1024
+# Тело ответа API читается по частям; больше порога — во временный файл на диске
+RESPONSE_SPOOL_BYTES = 1024 * 1024
+RESPONSE_CHUNK_BYTES = 64 * 1024
+# Отчёты длиннее порога выгружаются во временный файл, в окне — только начало
+REPORT_SPILL_CHARS = 200000
+REPORT_PREVIEW_CHARS = 20000
+MAX_UNDO = 200
+
+JOB_QUEUE_FILE = "jobs.db"
+# Аренда задания до отправки (может ждать бюджета) и после (дольше таймаута запроса)
+CLAIM_LEASE_SECONDS = 600
+SEND_LEASE_SECONDS = 180
+# Процесс, не обновлявший отметку дольше таймаута, считается завершившимся
+HEARTBEAT_SECONDS = 5
+PROCESS_TIMEOUT_SECONDS = 15
+# Простаивающий обработчик заглядывает в очередь с этим интервалом
+IDLE_POLL_SECONDS = 5
+# Одновременных пакетных запросов: остальные потоки планировщика свободны для интерфейса
+BATCH_WORKERS = 2
+SCHEDULER_WORKERS = 4
+# Каталоги, пропускаемые при пакетном анализе
+SKIPPED_DIRS = {'.git', '.venv', 'venv', '__pycache__', 'node_modules', '.tox', '.nox'}
+
+REVIEW_MODE = "🔀 Ревью изменений (git diff)"
+# Строк контекста вокруг хунка, если изменение вне функций и классов
+REVIEW_CONTEXT_LINES = 3
+# Более длинная функция отправляется как заголовок и окна вокруг изменений
+REVIEW_MAX_SCOPE_LINES = 80
+# Номер строки в ответе модели: "Строка 12", "строки 12", "line 12", "L12"
+FINDING_LINE = re.compile(r'\b(?:строк[аеи]?|line|L)\s*(\d+)', re.I)
+
+HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+
+class ApiError(Exception):
+    """Ошибочный ответ OpenRouter API"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+class BudgetExceededError(Exception):
+    """Запрос не помещается в бюджет токенов"""
+
+
+class PatchError(Exception):
+    """Хунк не удаётся применить к коду"""
+
+
+class LeaseLostError(Exception):
+    """Аренда задания истекла до отправки запроса"""
+
+
+def post_completion(url: str, api_key: str, model: str, prompt: str, timeout: int = 90) -> dict:
+    """Запрос к API; возвращается только текст ответа и поле usage
+
+    Тело читается по частям во временный буфер (крупное — на диск), а не
+    копится в объекте ответа; остальное дерево JSON освобождается сразу
+    после разбора. Тело ошибочного ответа читается не больше ERROR_BODY_LIMIT байт.
+    """
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "HTTP-Referer": "https://github.com/username/code-analyzer",
+        "X-Title": "Python Code Analyzer",
+        "Content-Type": "application/json"
+    }
+
+    data = {
+        "model": model,
+        "messages": [
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+    }
+
+    with requests.post(url, headers=headers, json=data, timeout=timeout, stream=True) as response:
+        if response.status_code != 200:
+            body = response.raw.read(ERROR_BODY_LIMIT, decode_content=True)
+            text = body.decode(response.encoding or 'utf-8', errors='replace')
+            try:
+                message = json.loads(text)['error'].get('message', 'Неизвестная ошибка')
+            except Exception:
+                message = text
+            raise ApiError(response.status_code, message)
+
+        with tempfile.SpooledTemporaryFile(max_size=RESPONSE_SPOOL_BYTES) as spool:
+            for chunk in response.iter_content(chunk_size=RESPONSE_CHUNK_BYTES):
+                spool.write(chunk)
+            spool.seek(0)
+            result = json.load(spool)
+
+    content = result['choices'][0]['message']['content']
+    usage = result.get('usage') or {}
+    del result
+    return {'choices': [{'message': {'content': content}}], 'usage': usage}
+
+
+def spill_report(content: str) -> Optional[str]:
+    """Выгрузка длинного отчёта во временный файл; None — отчёт достаточно короткий"""
+    if len(content) <= REPORT_SPILL_CHARS:
+        return None
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', prefix='code_analyzer_',
+                                     suffix='.txt', delete=False) as f:
+        f.write(content)
+        return f.name
+
+
+def current_rss() -> Optional[int]:
+    """Резидентная память процесса в байтах или None, если её не узнать
+
+    На macOS и других Unix без /proc возвращается пиковое значение.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [
+                ('cb', wintypes.DWORD),
+                ('PageFaultCount', wintypes.DWORD),
+                ('PeakWorkingSetSize', ctypes.c_size_t),
+                ('WorkingSetSize', ctypes.c_size_t),
+                ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                ('PagefileUsage', ctypes.c_size_t),
+                ('PeakPagefileUsage', ctypes.c_size_t),
+            ]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize
+        return None
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class TokenBudget:
+    """Поминутный и дневной бюджет токенов"""
+
+    # Доля бюджета, доступная классу приоритета: фоновые задания
+    # притормаживаются задолго до того, как лимит будет исчерпан
+    THROTTLE_SHARE = {
+        PRIORITY_INTERACTIVE: 1.0,
+        PRIORITY_BATCH: 0.8,
+        PRIORITY_SPECULATIVE: 0.5,
+    }
+
+    def __init__(self, per_minute: int, per_day: int):
+        self.per_minute = per_minute
+        self.per_day = per_day
+        self._lock = threading.Lock()
+        self._charges = deque()  # элементы [время, токены]
+
+    @staticmethod
+    def estimate_tokens(prompt: str) -> int:
+        """Оценка стоимости запроса до отправки"""
+        return len(prompt) // CHARS_PER_TOKEN + COMPLETION_TOKENS_RESERVE
+
+    def _spent(self, now: float, window: int) -> int:
+        return sum(tokens for ts, tokens in self._charges if now - ts < window)
+
+    def _retry_after(self, now: float, window: int) -> float:
+        for ts, tokens in self._charges:
+            if now - ts < window:
+                return window - (now - ts)
+        return 0.0
+
+    def try_reserve(self, tokens: int, priority: int, now: Optional[float] = None):
+        """Резервирование токенов: возвращает (запись, 0) или (None, секунды ожидания)"""
+        now = time.time() if now is None else now
+        share = self.THROTTLE_SHARE.get(priority, self.THROTTLE_SHARE[PRIORITY_SPECULATIVE])
+
+        with self._lock:
+            while self._charges and now - self._charges[0][0] >= 86400:
+                self._charges.popleft()
+
+            if self.per_day:
+                day_limit = self.per_day * share
+                if tokens > day_limit:
+                    raise BudgetExceededError("Запрос больше дневного бюджета токенов")
+                if self._spent(now, 86400) + tokens > day_limit:
+                    # Интерактивный запрос не должен ждать часами
+                    if priority == PRIORITY_INTERACTIVE:
+                        raise BudgetExceededError("Дневной бюджет токенов исчерпан")
+                    return None, self._retry_after(now, 86400)
+
+            if self.per_minute:
+                spent = self._spent(now, 60)
+                # Запрос больше поминутного лимита пропускаем в пустое окно
+                if spent and spent + tokens > self.per_minute * share:
+                    return None, self._retry_after(now, 60)
+
+            entry = [now, tokens]
+            self._charges.append(entry)
+            return entry, 0.0
+
+    def settle(self, entry, actual_tokens: int):
+        """Замена оценки фактическим расходом из поля usage"""
+        with self._lock:
+            entry[1] = actual_tokens
+
+    def usage(self):
+        """Расход токенов за последнюю минуту и за сутки"""
+        now = time.time()
+        with self._lock:
+            return self._spent(now, 60), self._spent(now, 86400)
+
+
+class AnalysisScheduler:
+    """Очередь запросов к API с классами приоритета и учётом бюджета"""
+
+    def __init__(self, send, budget: TokenBudget, workers: int = 2):
+        self.send = send
+        self.budget = budget
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+
+        for _ in range(workers):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def submit(self, prompt: str, priority: int = PRIORITY_INTERACTIVE, before_send=None) -> Future:
+        """Постановка промпта в очередь, результат — JSON ответа API
+
+        before_send вызывается непосредственно перед запросом; если он
+        возвращает False, запрос не отправляется (LeaseLostError).
+        """
+        future = Future()
+        tokens = self.budget.estimate_tokens(prompt)
+        with self._cond:
+            heapq.heappush(self._queue, (priority, next(self._seq), prompt, tokens, future, before_send))
+            self._cond.notify_all()
+        return future
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._queue)
+
+    def _next_job(self):
+        with self._cond:
+            while True:
+                if not self._queue:
+                    self._cond.wait()
+                    continue
+
+                priority, _, prompt, tokens, future, before_send = self._queue[0]
+                if future.cancelled():
+                    heapq.heappop(self._queue)
+                    continue
+
+                try:
+                    entry, delay = self.budget.try_reserve(tokens, priority)
+                except BudgetExceededError as e:
+                    heapq.heappop(self._queue)
+                    future.set_running_or_notify_cancel()
+                    future.set_exception(e)
+                    continue
+
+                if entry is None:
+                    # Ждём освобождения бюджета или более важного задания
+                    self._cond.wait(timeout=delay)
+                    continue
+
+                heapq.heappop(self._queue)
+                return prompt, tokens, entry, future, before_send
+
+    def _worker(self):
+        while True:
+            prompt, tokens, entry, future, before_send = self._next_job()
+            if not future.set_running_or_notify_cancel():
+                self.budget.settle(entry, 0)
+                continue
+
+            try:
+                if before_send is not None and not before_send():
+                    raise LeaseLostError("Задание перехвачено другим обработчиком")
+            except Exception as e:
+                self.budget.settle(entry, 0)
+                future.set_exception(e)
+                continue
+
+            try:
+                result = self.send(prompt)
+            except Exception as e:
+                # Без ответа расход неизвестен — резерв возвращается в бюджет
+                self.budget.settle(entry, 0)
+                future.set_exception(e)
+                continue
+
+            usage = result.get('usage') or {}
+            self.budget.settle(entry, usage.get('total_tokens') or tokens)
+            future.set_result(result)
+
+
+def split_hunks(diff_text: str) -> list:
+    """Извлечение хунков unified diff из ответа модели"""
+    hunks = []
+    current = None
+
+    for line in diff_text.splitlines():
+        if HUNK_HEADER.match(line):
+            current = [line]
+            hunks.append(current)
+        elif current is None:
+            continue
+        elif line.startswith(('```', '--- ', '+++ ', 'diff ')):
+            current = None
+        elif line.startswith('\\'):
+            continue  # "\ No newline at end of file"
+        elif line == '' or line[0] in ' +-':
+            current.append(line)
+        else:
+            current = None
+
+    result = []
+    for hunk in hunks:
+        while hunk and hunk[-1] == '':
+            hunk.pop()
+        if len(hunk) > 1:
+            result.append('\n'.join(hunk))
+    return result
+
+
+def parse_hunk(hunk_text: str):
+    """Разбор хунка: номер первой строки, старые и новые строки"""
+    header, *body = hunk_text.split('\n')
+    old_start = int(HUNK_HEADER.match(header).group(1))
+    old, new = [], []
+
+    for line in body:
+        # Модели часто теряют пробел у пустых строк контекста
+        tag, text = (line[0], line[1:]) if line else (' ', '')
+        if tag in ' -':
+            old.append(text)
+        if tag in ' +':
+            new.append(text)
+
+    return old_start, old, new
+
+
+def apply_hunk(code: str, hunk_text: str) -> str:
+    """Применение одного хунка к коду в памяти"""
+    lines = code.split('\n')
+    old_start, old, new = parse_hunk(hunk_text)
+
+    if not old:
+        # Чистая вставка: в заголовке указана строка, после которой вставлять
+        pos = min(old_start, len(lines))
+        return '\n'.join(lines[:pos] + new + lines[pos:])
+
+    # Номера строк от модели неточны — ищем блок ближе всего к заявленному месту
+    stripped = [line.rstrip() for line in old]
+    hint = old_start - 1
+    for pos in sorted(range(len(lines) - len(old) + 1), key=lambda i: abs(i - hint)):
+        if [line.rstrip() for line in lines[pos:pos + len(old)]] == stripped:
+            return '\n'.join(lines[:pos] + new + lines[pos + len(old):])
+
+    raise PatchError("Контекст хунка не найден в коде")
+
+
+# Имена, доступные без объявления в модуле
+IMPLICIT_NAMES = set(dir(builtins)) | {'__file__', '__module__', '__qualname__', '__class__'}
+
+
+def bound_names(tree) -> set:
+    """Все имена, которые где-либо связываются в модуле (без учёта областей видимости)"""
+    names = set(IMPLICIT_NAMES)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, ast.alias):
+            names.add(node.asname or node.name.split('.')[0])
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            names.update(node.names)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        elif getattr(node, 'name', None) and type(node).__name__ in ('MatchAs', 'MatchStar'):
+            names.add(node.name)
+        elif getattr(node, 'rest', None) and type(node).__name__ == 'MatchMapping':
+            names.add(node.rest)
+    return names
+
+
+def static_check(code: str) -> set:
+    """Быстрые локальные проверки: компиляция и разбор AST"""
+    try:
+        tree = compile(code, '<patch>', 'exec', ast.PyCF_ONLY_AST)
+    except SyntaxError as e:
+        return {f"SyntaxError: {e.msg}: {(e.text or '').strip()}"}
+
+    problems = set()
+
+    for node in ast.walk(tree):
+        seen = set()
+        for child in getattr(node, 'body', []):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                if child.name in seen:
+                    problems.add(f"Повторное определение {child.name}")
+                seen.add(child.name)
+
+    # После "import *" набор имён неизвестен
+    star_import = any(
+        isinstance(node, ast.ImportFrom) and any(alias.name == '*' for alias in node.names)
+        for node in ast.walk(tree)
+    )
+    if not star_import:
+        # Например, переименование без правки мест вызова
+        names = bound_names(tree)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id not in names:
+                problems.add(f"Неопределённое имя {node.id}")
+
+    return problems
+
+
+def apply_hunks(code: str, hunks: list):
+    """Последовательное применение хунков: (код, применённые, неприменимые)"""
+    applied, conflicts = [], []
+    for hunk in hunks:
+        try:
+            code = apply_hunk(code, hunk)
+            applied.append(hunk)
+        except PatchError:
+            conflicts.append(hunk)
+    return code, applied, conflicts
+
+
+def check_hunks(code: str, hunks: list, baseline_problems: set):
+    """Проверка набора хунков целиком: (код, применённые, неприменимые, новые проблемы)
+
+    Пока исходный код не компилируется, сравнивать не с чем: новыми
+    считаются все проблемы результата. Функция выполняется в пуле
+    процессов, поэтому объявлена на уровне модуля.
+    """
+    patched, applied, conflicts = apply_hunks(code, hunks)
+    problems = static_check(patched)
+    if not any(problem.startswith("SyntaxError") for problem in baseline_problems):
+        problems -= baseline_problems
+    return patched, applied, conflicts, problems
+
+
+class AutoFixer:
+    """Автоисправление: патчи от модели, локальная проверка, повтор отклонённых хунков"""
+
+    def __init__(self, scheduler: AnalysisScheduler, get_prompt):
+        self.scheduler = scheduler
+        self.get_prompt = get_prompt
+        self._pool = None
+
+    def run_parallel(self, fn, *args) -> list:
+        """Параллельный запуск проверок в пуле процессов"""
+        if len(args[0]) < 2:
+            return list(map(fn, *args))
+        if self._pool is None:
+            # fork из многопоточного процесса Tk копирует захваченные блокировки
+            self._pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context('spawn'))
+        return list(self._pool.map(fn, *args))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def request_hunks(self, prompt: str) -> list:
+        result = self.scheduler.submit(prompt, PRIORITY_INTERACTIVE).result()
+        return split_hunks(result['choices'][0]['message']['content'])
+
+    def retry_prompt(self, code: str, failed: list) -> str:
+        rejected = "\n\n".join(
+            f"```diff\n{hunk}\n```\nПричина: {'; '.join(problems)}"
+            for hunk, problems in failed
+        )
+        return f"""Эти исправления не прошли проверку для следующего Python кода:
+
+```python
+{code}
+```
+
+Отклонённые хунки:
+
+{rejected}
+
+Исправь только эти хунки. Ответь unified diff относительно кода выше, без пояснений."""
+
+    def settle_hunks(self, code: str, hunks: list):
+        """Применение всех хунков и откат тех, что добавляют проблемы
+
+        Полный набор и варианты без каждого из хунков проверяются одной
+        параллельной партией; по вариантам выбирается хунк для отката.
+        Возвращает (код, принятые хунки, отклонённые хунки с причинами).
+        """
+        baseline = static_check(code)
+        candidates = list(hunks)
+        rejected = []
+        conflict_reason = "Контекст хунка не найден в коде"
+
+        while True:
+            variants = [candidates]
+            if len(candidates) > 1:
+                variants += [candidates[:i] + candidates[i + 1:] for i in range(len(candidates))]
+            results = self.run_parallel(
+                check_hunks, [code] * len(variants), variants, [baseline] * len(variants)
+            )
+            patched, accepted, conflicts, new = results[0]
+
+            if conflicts:
+                rejected += [(hunk, [conflict_reason]) for hunk in conflicts]
+                conflict_reason = "Конфликт с другими хунками"
+                candidates = accepted
+                continue
+            if not new:
+                return patched, accepted, rejected
+            if len(results) == 1:
+                rejected += [(hunk, sorted(new)) for hunk in accepted]
+                return code, [], rejected
+
+            best = min(range(1, len(results)), key=lambda i: len(results[i][3]))
+            if len(results[best][3]) >= len(new):
+                # Ни один откат не помогает — отклоняется весь набор
+                rejected += [(hunk, sorted(new)) for hunk in accepted]
+                return code, [], rejected
+
+            rejected.append((candidates[best - 1], sorted(new - results[best][3]) or sorted(new)))
+            candidates = candidates[:best - 1] + candidates[best:]
+
+    def run(self, code: str):
+        """Возвращает (исправленный код, принятые хунки, отклонённые хунки с причинами)"""
+        current = code
+        applied, rejected = [], []
+        hunks = self.request_hunks(self.get_prompt(code, "Автоисправление"))
+
+        for attempt in range(AUTOFIX_RETRIES + 1):
+            current, accepted, rejected = self.settle_hunks(current, hunks)
+            applied += accepted
+
+            if not rejected or attempt == AUTOFIX_RETRIES:
+                break
+            hunks = self.request_hunks(self.retry_prompt(current, rejected))
+            if not hunks:
+                break
+
+        return current, applied, rejected
+
+
+class JobQueue:
+    """Персистентная очередь пакетных заданий в SQLite (режим WAL)
+
+    Состояния: pending → claimed → sent → done/failed. Обработчик берёт
+    задание в аренду и переводит его в sent только пока аренда за ним.
+    Задания с просроченной арендой или арендатором из завершившегося
+    процесса (нет свежей отметки в processes) освобождаются: claimed
+    возвращаются в очередь, а sent помечаются failed — ответ мог быть уже
+    оплачен, поэтому повторно они отправляются только вручную (retry_failed).
+    """
+
+    def __init__(self, path: str = JOB_QUEUE_FILE):
+        self.path = path
+        self.process_id = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                source TEXT NOT NULL,
+                analysis_type TEXT NOT NULL,
+                prompt TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                owner TEXT,
+                lease_until REAL,
+                result TEXT,
+                error TEXT,
+                updated REAL NOT NULL,
+                UNIQUE (source, prompt)
+            )""")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS processes (id TEXT PRIMARY KEY, seen REAL NOT NULL)")
+
+        self._heartbeat()
+        threading.Thread(target=self._heartbeat_loop, daemon=True).start()
+
+    def _heartbeat(self):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO processes (id, seen) VALUES (?, ?)", (self.process_id, time.time())
+            )
+
+    def _heartbeat_loop(self):
+        while not self._closed.wait(HEARTBEAT_SECONDS):
+            try:
+                self._heartbeat()
+            except sqlite3.Error:
+                pass
+
+    def close(self):
+        """Остановка отметок процесса и закрытие базы"""
+        self._closed.set()
+        with self._lock:
+            self._conn.execute("DELETE FROM processes WHERE id = ?", (self.process_id,))
+            self._conn.close()
+
+    def new_owner(self) -> str:
+        """Идентификатор обработчика: процесс и поток"""
+        return f"{self.process_id}:{uuid.uuid4().hex[:8]}"
+
+    def _transaction(self, statements):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(self._conn)
+                self._conn.execute("COMMIT")
+                return result
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, jobs: list, priority: int = PRIORITY_BATCH) -> int:
+        """Добавление заданий (source, analysis_type, prompt); повторы игнорируются"""
+        now = time.time()
+        rows = [(source, analysis_type, prompt, priority, now) for source, analysis_type, prompt in jobs]
+
+        def insert(conn):
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO jobs (source, analysis_type, prompt, priority, updated) "
+                "VALUES (?, ?, ?, ?, ?)", rows
+            )
+            return conn.total_changes - before
+
+        return self._transaction(insert)
+
+    def claim(self, owner: str):
+        """Аренда следующего задания или None"""
+        now = time.time()
+
+        def take(conn):
+            # Свежая отметка: после сна или зависания поток отметок мог отстать
+            conn.execute(
+                "INSERT OR REPLACE INTO processes (id, seen) VALUES (?, ?)", (self.process_id, now)
+            )
+            owner_process = "substr(owner, 1, instr(owner, ':') - 1)"
+            dead_owner = f"{owner_process} NOT IN (SELECT id FROM processes WHERE seen >= ?)"
+            alive_since = now - PROCESS_TIMEOUT_SECONDS
+            conn.execute(
+                "UPDATE jobs SET state = 'pending', owner = NULL, updated = ? "
+                f"WHERE state = 'claimed' AND (lease_until < ? OR {dead_owner})", (now, now, alive_since)
+            )
+            # Отправленные задания своего процесса завершает сам обработчик
+            conn.execute(
+                "UPDATE jobs SET state = 'failed', error = 'Прервано после отправки запроса', updated = ? "
+                f"WHERE state = 'sent' AND {owner_process} != ? AND (lease_until < ? OR {dead_owner})",
+                (now, self.process_id, now, alive_since)
+            )
+            conn.execute("DELETE FROM processes WHERE seen < ?", (alive_since,))
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE state = 'pending' ORDER BY priority, id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET state = 'claimed', owner = ?, lease_until = ?, updated = ? WHERE id = ?",
+                (owner, now + CLAIM_LEASE_SECONDS, now, row['id'])
+            )
+            return row
+
+        return self._transaction(take)
+
+    def _update(self, sql: str, params: tuple) -> bool:
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount == 1
+
+    def mark_sent(self, job_id: int, owner: str) -> bool:
+        """Фиксация отправки; False — аренда уже потеряна, отправлять нельзя"""
+        now = time.time()
+        return self._update(
+            "UPDATE jobs SET state = 'sent', lease_until = ?, updated = ? "
+            "WHERE id = ? AND owner = ? AND state = 'claimed' AND lease_until >= ?",
+            (now + SEND_LEASE_SECONDS, now, job_id, owner, now)
+        )
+
+    def complete(self, job_id: int, owner: str, result: str) -> bool:
+        """Сохранение результата; False — задание уже обрабатывает другой обработчик
+
+        Оплаченный ответ сохраняется и для задания, помеченного failed
+        или возвращённого в очередь, пока его не взял другой обработчик.
+        """
+        return self._update(
+            "UPDATE jobs SET state = 'done', result = ?, error = NULL, owner = ?, lease_until = NULL, "
+            "updated = ? WHERE id = ? AND (state = 'pending' OR (owner = ? AND state IN ('sent', 'failed')))",
+            (result, owner, time.time(), job_id, owner)
+        )
+
+    def fail(self, job_id: int, owner: str, error: str) -> bool:
+        return self._update(
+            "UPDATE jobs SET state = 'failed', error = ?, lease_until = NULL, updated = ? "
+            "WHERE id = ? AND owner = ? AND state IN ('claimed', 'sent')",
+            (error, time.time(), job_id, owner)
+        )
+
+    def retry_failed(self) -> int:
+        """Ручной возврат неудавшихся заданий в очередь"""
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET state = 'pending', owner = NULL, error = NULL, updated = ? "
+                "WHERE state = 'failed'", (time.time(),)
+            ).rowcount
+
+    def stats(self) -> dict:
+        """Количество заданий по состояниям"""
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {state: count for state, count in rows}
+
+    def finished(self, page_size: int = 100):
+        """Завершённые задания для отчёта (читаются страницами)"""
+        last = ('', 0)
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, source, analysis_type, state, result, error FROM jobs "
+                    "WHERE state IN ('done', 'failed') AND (source, id) > (?, ?) "
+                    "ORDER BY source, id LIMIT ?", (*last, page_size)
+                ).fetchall()
+            yield from rows
+            if len(rows) < page_size:
+                return
+            last = (rows[-1]['source'], rows[-1]['id'])
+
+    def clear_finished(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE state IN ('done', 'failed')")
+
+
+class BatchRunner:
+    """Обработчики очереди заданий: аренда → планировщик → сохранение результата
+
+    Обработчики живут до конца работы процесса и ждут новых заданий,
+    поэтому задания, добавленные во время простоя, не теряются.
+    """
+
+    def __init__(self, queue: JobQueue, scheduler: AnalysisScheduler, workers: int = BATCH_WORKERS):
+        self.queue = queue
+        self.scheduler = scheduler
+        self.workers = workers
+        self._wakeup = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Запуск обработчиков или пробуждение уже запущенных"""
+        if not self._threads:
+            self._threads = [
+                threading.Thread(target=self._work, daemon=True) for _ in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+        self._wakeup.set()
+
+    def _retry(self, operation, *args):
+        """Операция с очередью; при блокировке базы — повтор после паузы"""
+        while True:
+            try:
+                return operation(*args)
+            except sqlite3.OperationalError:
+                time.sleep(IDLE_POLL_SECONDS)
+
+    def _work(self):
+        owner = self.queue.new_owner()
+        while True:
+            self._wakeup.clear()
+            try:
+                job = self._retry(self.queue.claim, owner)
+            except sqlite3.ProgrammingError:
+                return  # очередь закрыта при выходе из приложения
+            if job is None:
+                # Чужие аренды могут истечь — очередь проверяется и без сигнала
+                self._wakeup.wait(IDLE_POLL_SECONDS)
+                continue
+
+            job_id = job['id']
+            future = self.scheduler.submit(
+                job['prompt'], job['priority'],
+                before_send=lambda: self.queue.mark_sent(job_id, owner)
+            )
+            try:
+                try:
+                    result = future.result()
+                    content = result['choices'][0]['message']['content']
+                except LeaseLostError:
+                    continue
+                except Exception as e:
+                    self._retry(self.queue.fail, job_id, owner, str(e) or type(e).__name__)
+                    continue
+                if not self._retry(self.queue.complete, job_id, owner, content):
+                    # Задание уже взял другой обработчик: его ответ и будет сохранён
+                    continue
+            except sqlite3.ProgrammingError:
+                return
+
+
+def parse_diff_files(diff_text: str) -> list:
+    """Разбор unified diff: [(путь, [(начало, длина, текст хунка)])] для .py файлов"""
+    files = []
+    hunks = None
+    lines = diff_text.split('\n')
+    i = 0
+
+    while i < len(lines):
+        line = lines[i]
+        match = HUNK_HEADER.match(line)
+        i += 1
+
+        if line.startswith('+++ '):
+            path = line[4:].split('\t')[0].strip()
+            if path.startswith('b/'):
+                path = path[2:]
+            hunks = [] if path.endswith('.py') else None
+            if hunks is not None:
+                files.append((path, hunks))
+        elif match:
+            # Конец хунка определяем по числу строк из заголовка
+            new_start = int(match.group(3))
+            new_length = int(match.group(4)) if match.group(4) is not None else 1
+            old_left = int(match.group(2)) if match.group(2) is not None else 1
+            new_left = new_length
+            body = [line]
+            while i < len(lines) and (old_left > 0 or new_left > 0):
+                tag = lines[i][:1] or ' '
+                if tag in ' -':
+                    old_left -= 1
+                if tag in ' +':
+                    new_left -= 1
+                body.append(lines[i])
+                i += 1
+            if hunks is not None:
+                hunks.append((new_start, new_length, '\n'.join(body)))
+
+    return [(path, hunks) for path, hunks in files if hunks]
+
+
+def hunk_new_lines(start: int, hunk_text: str) -> dict:
+    """Строки новой версии, присутствующие в хунке: {номер: текст}"""
+    new_lines = {}
+    lineno = start
+    for line in hunk_text.split('\n')[1:]:
+        if line[:1] in ('', ' ', '+'):
+            new_lines[lineno] = line[1:]
+            lineno += 1
+    return new_lines
+
+
+def is_significant(text: str) -> bool:
+    """Строка кода, а не пустая строка или комментарий"""
+    stripped = text.strip()
+    return bool(stripped) and not stripped.startswith('#')
+
+
+def hunk_changed_lines(start: int, hunk_text: str) -> list:
+    """Номера строк новой версии, значимо изменённых хунком
+
+    Пустые строки и комментарии пропускаются; удаление кода отмечается
+    строкой, которая встала на его место.
+    """
+    changed = []
+    lineno = start
+    for line in hunk_text.split('\n')[1:]:
+        tag, text = line[:1] or ' ', line[1:]
+        if tag == '+':
+            if is_significant(text):
+                changed.append(lineno)
+            lineno += 1
+        elif tag == ' ':
+            lineno += 1
+        elif tag == '-' and is_significant(text) and (not changed or changed[-1] != lineno):
+            changed.append(lineno)
+    return changed
+
+
+def scope_start(node) -> int:
+    """Первая строка определения с учётом декораторов"""
+    return min([node.lineno] + [d.lineno for d in getattr(node, 'decorator_list', [])])
+
+
+def enclosing_scope(tree, lineno: int):
+    """Наименьшая функция или класс, содержащие строку, или None"""
+    best = None
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        if scope_start(node) <= lineno <= node.end_lineno:
+            if best is None or node.end_lineno - scope_start(node) < best.end_lineno - scope_start(best):
+                best = node
+    return best
+
+
+def merge_ranges(ranges: list) -> list:
+    """Слияние пересекающихся и соседних диапазонов строк"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def numbered_snippet(lines: dict, changed: set) -> str:
+    """Фрагмент кода с номерами строк; изменённые строки помечены '>', пропуски — '⋮'"""
+    result = []
+    previous = None
+    for n, text in sorted(lines.items()):
+        if previous is not None and n > previous + 1:
+            result.append("    ⋮")
+        result.append(f"{n:>5}{'>' if n in changed else ' '} {text}")
+        previous = n
+    return '\n'.join(result)
+
+
+class DiffReviewer:
+    """Ревью изменений: в модель уходят только области кода, затронутые diff"""
+
+    def __init__(self, scheduler: AnalysisScheduler, get_prompt):
+        self.scheduler = scheduler
+        self.get_prompt = get_prompt
+
+    @staticmethod
+    def file_regions(tree, line_count: int, changed: list) -> list:
+        """Наборы строк для отдельных запросов: [(номера строк, изменённые строки)]
+
+        Изменение в функции — вся наименьшая функция; в теле класса или
+        длинной функции — их заголовок и окно вокруг строки; на уровне
+        модуля — окна, слитые в непрерывные диапазоны.
+        """
+        functions, outlines, module = {}, {}, []
+
+        for lineno in changed:
+            node = enclosing_scope(tree, lineno)
+            window = (max(1, lineno - REVIEW_CONTEXT_LINES), min(line_count, lineno + REVIEW_CONTEXT_LINES))
+            if node is None:
+                module.append(window)
+            elif (isinstance(node, ast.ClassDef)
+                  or node.end_lineno - scope_start(node) + 1 > REVIEW_MAX_SCOPE_LINES):
+                start = scope_start(node)
+                header_end = max(node.lineno, scope_start(node.body[0]) - 1)
+                lines, marks = outlines.setdefault(start, (set(range(start, header_end + 1)), set()))
+                lines.update(range(max(window[0], start), min(window[1], node.end_lineno) + 1))
+                marks.add(lineno)
+            else:
+                functions.setdefault((scope_start(node), node.end_lineno), set()).add(lineno)
+
+        regions = []
+        for (start, end), marks in functions.items():
+            # Вложенная функция уже входит в объемлющую
+            outer = [(s, e) for s, e in functions if s <= start and end <= e and (s, e) != (start, end)]
+            if outer:
+                functions[max(outer, key=lambda r: r[1] - r[0])].update(marks)
+                continue
+            regions.append((set(range(start, end + 1)), marks))
+
+        # Окна не повторяют строки, уже отправляемые в других фрагментах
+        covered = set().union(*(lines for lines, _ in regions))
+        for lines, marks in outlines.values():
+            lines -= covered
+            regions.append((lines, marks))
+        covered = set().union(*(lines for lines, _ in regions))
+        for start, end in merge_ranges(module):
+            lines = set(range(start, end + 1)) - covered
+            regions.append((lines, {n for n in changed if n in lines}))
+        return regions
+
+    def collect_scopes(self, diff_text: str, read_file) -> list:
+        """Фрагменты для анализа: (путь, хунки, текст фрагмента, число строк)"""
+        scopes = []
+
+        for path, hunks in parse_diff_files(diff_text):
+            source = read_file(path)
+            try:
+                tree = ast.parse(source) if source is not None else None
+            except SyntaxError:
+                tree = None
+
+            if tree is None:
+                # Нет новой версии файла — анализируем сами хунки
+                for start, length, hunk_text in hunks:
+                    changed = hunk_changed_lines(start, hunk_text)
+                    if changed:
+                        new_lines = hunk_new_lines(start, hunk_text)
+                        snippet = numbered_snippet(new_lines, set(changed))
+                        scopes.append((path, [(start, length, hunk_text)], snippet, len(new_lines)))
+                continue
+
+            lines = source.split('\n')
+            # Удаление в конце файла отмечается последней строкой
+            changed = sorted({min(n, len(lines)) for start, length, hunk_text in hunks
+                              for n in hunk_changed_lines(start, hunk_text)})
+
+            for numbers, marks in self.file_regions(tree, len(lines), changed):
+                first, last = min(numbers), max(numbers)
+                scope_hunks = [h for h in hunks if h[0] <= last and first <= h[0] + max(h[1], 1) - 1]
+                snippet = numbered_snippet({n: lines[n - 1] for n in numbers}, marks)
+                scopes.append((path, scope_hunks, snippet, len(numbers)))
+
+        return scopes
+
+    def run(self, diff_text: str, read_file) -> str:
+        """Параллельный анализ фрагментов и отчёт, привязанный к хункам"""
+        scopes = self.collect_scopes(diff_text, read_file)
+        if not scopes:
+            return "В diff нет изменений Python файлов."
+
+        futures = [
+            self.scheduler.submit(self.get_prompt(snippet, "Ревью изменений"), PRIORITY_INTERACTIVE)
+            for path, hunks, snippet, size in scopes
+        ]
+
+        # Находки группируются по файлу и хунку новой версии
+        findings = {}
+        for (path, hunks, snippet, size), future in zip(scopes, futures):
+            content = future.result()['choices'][0]['message']['content']
+            for line in content.split('\n'):
+                line = line.strip()
+                match = FINDING_LINE.search(line)
+                if not line or not match:
+                    continue
+                lineno = int(match.group(1))
+                header = next(
+                    (text.split('\n')[0] for start, length, text in hunks
+                     if start <= lineno <= start + max(length, 1) - 1),
+                    "Вне изменённых строк"
+                )
+                findings.setdefault(path, {}).setdefault(header, []).append(line)
+
+        files = {path for path, *_ in scopes}
+        report = f"🔀 Файлов: {len(files)}, фрагментов: {len(scopes)}, "
+        report += f"строк отправлено: {sum(size for *_, size in scopes)}\n\n"
+        for path in sorted(files):
+            report += "═" * 80 + f"\n📄 {path}\n" + "═" * 80 + "\n"
+            for header, items in findings.get(path, {}).items():
+                report += f"\n{header}\n" + "\n".join(f"  • {item}" for item in items) + "\n"
+            if path not in findings:
+                report += "\n✅ Замечаний нет\n"
+            report += "\n"
+        return report
+
 
 class CodeAnalyzerApp:
     def __init__(self, root):
@@ -27,29 +1134,51 @@ class CodeAnalyzerApp:
         self.warning_yellow = "#f59e0b"
 
         self.config_file = "config.json"
-        self.api_key = self.load_api_key()
+        self.config = self.load_config()
+        # Временный файл с полным текстом длинного отчёта
+        self.report_file = None
+        self.api_key = self.config.get('api_key')
 
         if not self.api_key:
             self.request_api_key()
 
+        # Бюджет токенов и планировщик запросов к API
+        self.budget = TokenBudget(
+            self.config.get('tokens_per_minute', DEFAULT_TOKENS_PER_MINUTE),
+            self.config.get('tokens_per_day', DEFAULT_TOKENS_PER_DAY)
+        )
+        self.scheduler = AnalysisScheduler(self.send_request, self.budget, SCHEDULER_WORKERS)
+        self.autofixer = AutoFixer(self.scheduler, self.get_prompt)
+        self.reviewer = DiffReviewer(self.scheduler, self.get_prompt)
+        # Фоновые сценарии из нескольких запросов (автоисправление)
+        self.background = ThreadPoolExecutor(max_workers=2)
+
+        # Пакетные задания переживают перезапуск приложения
+        self.job_queue = JobQueue(self.config.get('job_queue', JOB_QUEUE_FILE))
+        self.batch_runner = BatchRunner(self.job_queue, self.scheduler)
+
         self.setup_ui()
 
-    def load_api_key(self) -> Optional[str]:
-        """Загрузка API ключа из config.json"""
+        # Обработчики сразу подхватывают задания, не завершённые до перезапуска
+        self.batch_runner.start()
+        self.poll_batch()
+
+    def load_config(self) -> dict:
+        """Загрузка настроек из config.json"""
         if os.path.exists(self.config_file):
             try:
                 with open(self.config_file, 'r') as f:
-                    config = json.load(f)
-                    return config.get('api_key')
+                    return json.load(f)
             except Exception:
-                return None
-        return None
+                return {}
+        return {}
 
     def save_api_key(self, api_key: str):
         """Сохранение API ключа в config.json"""
         try:
+            self.config['api_key'] = api_key
             with open(self.config_file, 'w') as f:
-                json.dump({'api_key': api_key}, f)
+                json.dump(self.config, f)
         except Exception as e:
             messagebox.showerror("Ошибка", f"Не удалось сохранить ключ: {e}")
 
@@ -228,7 +1357,9 @@ class CodeAnalyzerApp:
                 "🔍 Полный аудит (ошибки, PEP 8, оптимизация)",
                 "🐛 Только баги и ошибки",
                 "📏 Проверка PEP 8 стандарта",
-                "📖 Объяснение работы кода"
+                "📖 Объяснение работы кода",
+                AUTOFIX_MODE,
+                REVIEW_MODE
             ],
             state="readonly",
             width=42,
@@ -251,6 +1382,17 @@ class CodeAnalyzerApp:
         )
         model_label.pack(side=tk.RIGHT, padx=20)
 
+        # Индикатор расхода токенов
+        self.budget_label = tk.Label(
+            control_inner,
+            text="",
+            bg=self.bg_secondary,
+            fg=self.fg_secondary,
+            font=("Segoe UI", 9)
+        )
+        self.budget_label.pack(side=tk.RIGHT, padx=10)
+        self.update_budget_label()
+
         # ============ INPUT SECTION ============
         input_section = tk.Frame(main_container, bg=self.bg_primary, height=250)
         input_section.pack(fill=tk.X, pady=(0, 15))
@@ -323,7 +1465,7 @@ class CodeAnalyzerApp:
             padx=12,
             pady=12,
             undo=True,
-            maxundo=-1,
+            maxundo=MAX_UNDO,
             selectbackground=self.accent_purple,
             selectforeground="white"
         )
@@ -389,6 +1531,16 @@ class CodeAnalyzerApp:
         )
         self.status_label.pack(side=tk.RIGHT, pady=5)
 
+        # Прогресс пакетного анализа
+        self.batch_label = tk.Label(
+            output_header,
+            text="",
+            bg=self.bg_primary,
+            fg=self.accent_cyan,
+            font=("Segoe UI", 10)
+        )
+        self.batch_label.pack(side=tk.RIGHT, padx=15, pady=5)
+
         # Поле вывода
         output_frame = tk.Frame(
             output_section,
@@ -450,7 +1602,50 @@ class CodeAnalyzerApp:
             cursor="hand2",
             activebackground=self.bg_tertiary
         )
-        clear_btn.pack(side=tk.LEFT)
+        clear_btn.pack(side=tk.LEFT, padx=(0, 8))
+
+        batch_btn = tk.Button(
+            left_buttons,
+            text="📦 Пакетный анализ",
+            command=self.start_batch,
+            bg=self.bg_secondary,
+            fg=self.accent_blue,
+            font=("Segoe UI", 10, "bold"),
+            relief=tk.FLAT,
+            padx=18,
+            pady=8,
+            cursor="hand2",
+            activebackground=self.bg_tertiary
+        )
+        batch_btn.pack(side=tk.LEFT, padx=(0, 8))
+
+        batch_menu_btn = tk.Menubutton(
+            left_buttons,
+            text="📑 Пакет ▾",
+            bg=self.bg_secondary,
+            fg=self.accent_purple,
+            font=("Segoe UI", 10, "bold"),
+            relief=tk.FLAT,
+            padx=18,
+            pady=8,
+            cursor="hand2",
+            activebackground=self.bg_tertiary
+        )
+        batch_menu = tk.Menu(
+            batch_menu_btn,
+            tearoff=0,
+            bg=self.bg_tertiary,
+            fg=self.fg_primary,
+            activebackground=self.accent_blue,
+            activeforeground="white",
+            font=("Segoe UI", 9)
+        )
+        batch_menu.add_command(label="📑 Отчёт", command=self.show_batch_report)
+        batch_menu.add_command(label="🔁 Повторить неудавшиеся", command=self.retry_failed_batch)
+        batch_menu.add_separator()
+        batch_menu.add_command(label="🗑️ Очистить завершённые", command=self.clear_finished_batch)
+        batch_menu_btn.config(menu=batch_menu)
+        batch_menu_btn.pack(side=tk.LEFT)
 
         # Правая группа кнопок
         right_buttons = tk.Frame(bottom_frame, bg=self.bg_primary)
@@ -469,7 +1664,22 @@ class CodeAnalyzerApp:
             cursor="hand2",
             activebackground=self.bg_tertiary
         )
-        key_btn.pack()
+        key_btn.pack(side=tk.LEFT)
+
+        memory_btn = tk.Button(
+            right_buttons,
+            text="🧠 Память",
+            command=self.show_memory_report,
+            bg=self.bg_secondary,
+            fg=self.accent_cyan,
+            font=("Segoe UI", 10, "bold"),
+            relief=tk.FLAT,
+            padx=18,
+            pady=8,
+            cursor="hand2",
+            activebackground=self.bg_tertiary
+        )
+        memory_btn.pack(side=tk.LEFT, padx=(8, 0))
 
         # Привязка горячих клавиш
         self.code_input.bind('<Control-v>', lambda e: self.paste_code())
@@ -619,16 +1829,52 @@ if __name__ == '__main__':
 - Зависимости и внешние библиотеки (если есть)
 - Возможные варианты использования
 
-Объясняй простым языком, как для начинающего разработчика."""
+Объясняй простым языком, как для начинающего разработчика.""",
+
+            "Автоисправление": f"""Найди ошибки и нарушения PEP 8 в этом Python коде и исправь их:
+
+```python
+{code}
+```
+
+Ответь только исправлениями в формате unified diff (```diff), без пояснений.
+Каждое независимое исправление оформи отдельным хунком @@ с 2-3 строками контекста.
+Не меняй поведение кода сверх необходимого.""",
+
+            "Ревью изменений": f"""Проведи ревью изменённого фрагмента Python кода.
+Слева номера строк, строки с '>' изменены в этом коммите:
+
+```
+{code}
+```
+
+Найди ошибки, потенциальные исключения и нарушения PEP 8, в первую очередь в изменённых строках.
+Каждое замечание пиши отдельной строкой в формате "Строка N: описание и исправление".
+Если замечаний нет, ответь "Замечаний нет"."""
         }
 
         return prompts.get(analysis_type, prompts["Полный аудит (ошибки, PEP 8, оптимизация, объяснение)"])
 
+    def send_request(self, prompt: str) -> dict:
+        """Запрос к OpenRouter API (выполняется в потоке планировщика)"""
+        return post_completion(OPENROUTER_URL, self.api_key, self.model_choice_value, prompt)
+
+    def update_budget_label(self):
+        """Обновление индикатора расхода токенов"""
+        minute, day = self.budget.usage()
+        text = f"💰 {minute}/{self.budget.per_minute or '∞'} мин · {day}/{self.budget.per_day or '∞'} сут"
+        pending = self.scheduler.pending()
+        if pending:
+            text += f" · ⏳ {pending}"
+        self.budget_label.config(text=text)
+
     def analyze_code(self):
-        """Отправка кода на анализ через OpenRouter API"""
+        """Постановка кода в очередь на анализ через OpenRouter API"""
         code = self.code_input.get("1.0", tk.END).strip()
+        analysis_type = self.analysis_type.get()
 
-        if not code:
+        # Для ревью ревизий git редактор может быть пустым
+        if not code and analysis_type != REVIEW_MODE:
             messagebox.showwarning("Предупреждение", "Введите код для анализа!")
             return
 
@@ -637,8 +1883,10 @@ if __name__ == '__main__':
             self.request_api_key()
             return
 
-        analysis_type = self.analysis_type.get()
-        model = self.model_choice_value
+        if analysis_type == REVIEW_MODE:
+            review = self.prepare_review(code)
+            if review is None:
+                return
 
         # Показываем процесс анализа
         self.status_label.config(text="⏳ Анализ...", fg=self.warning_yellow)
@@ -647,88 +1895,41 @@ if __name__ == '__main__':
         self.output_text.insert(tk.END, "⏳ Отправка кода на анализ...\n\n")
         self.output_text.insert(tk.END, "Пожалуйста, подождите. Это может занять несколько секунд.\n")
         self.output_text.config(state=tk.DISABLED)
-        self.root.update()
 
-        try:
+        if analysis_type == REVIEW_MODE:
+            future = self.background.submit(self.reviewer.run, *review)
+            on_result = lambda result: self.show_report(REVIEW_MODE, result)
+        elif analysis_type == AUTOFIX_MODE:
+            future = self.background.submit(self.autofixer.run, code)
+            on_result = lambda result: self.apply_autofix(code, *result)
+        else:
             prompt = self.get_prompt(code, analysis_type)
-
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "HTTP-Referer": "https://github.com/username/code-analyzer",
-                "X-Title": "Python Code Analyzer",
-                "Content-Type": "application/json"
-            }
-
-            data = {
-                "model": model,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-            }
-
-            response = requests.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=90
+            future = self.scheduler.submit(prompt, PRIORITY_INTERACTIVE)
+            on_result = lambda result: self.show_report(
+                analysis_type, result['choices'][0]['message']['content']
             )
 
-            if response.status_code == 200:
-                result = response.json()
-                content = result['choices'][0]['message']['content']
-
-                self.status_label.config(text="✅ Готово", fg=self.success_green)
-                self.output_text.config(state=tk.NORMAL)
-                self.output_text.delete("1.0", tk.END)
+        self.update_budget_label()
+        self.root.after(100, self.poll_future, future, on_result)
 
-                # Красивый заголовок отчёта
-                self.output_text.insert(tk.END, "╔" + "═" * 78 + "╗\n", "header")
-                self.output_text.insert(tk.END, "║" + " " * 20 + "РЕЗУЛЬТАТ АНАЛИЗА" + " " * 41 + "║\n", "header")
-                self.output_text.insert(tk.END, "╚" + "═" * 78 + "╝\n\n", "header")
-
-                self.output_text.insert(tk.END, f"📊 Тип: ", "bold")
-                self.output_text.insert(tk.END, f"{analysis_type}\n")
-                self.output_text.insert(tk.END, f"⚡ Модель: ", "bold")
-                self.output_text.insert(tk.END, "Mistral 7B Instruct\n")
-                self.output_text.insert(tk.END, "─" * 80 + "\n\n")
-
-                self.output_text.insert(tk.END, content)
-
-                # Стили для текста
-                self.output_text.tag_config("header", foreground=self.accent_cyan)
-                self.output_text.tag_config("bold", foreground=self.accent_purple, font=("Consolas", 10, "bold"))
+    def poll_future(self, future: Future, on_result):
+        """Ожидание фонового результата без блокировки интерфейса"""
+        if not future.done():
+            self.root.after(100, self.poll_future, future, on_result)
+            return
 
-                self.output_text.config(state=tk.DISABLED)
-            else:
-                self.status_label.config(text="❌ Ошибка", fg=self.error_red)
-                error_msg = f"❌ ОШИБКА API: {response.status_code}\n\n"
-
-                try:
-                    error_json = response.json()
-                    if 'error' in error_json:
-                        error_msg += f"Сообщение: {error_json['error'].get('message', 'Неизвестная ошибка')}\n"
-                except:
-                    error_msg += response.text
-
-                if response.status_code == 401:
-                    error_msg = "❌ Неверный API ключ.\n\n"
-                    error_msg += "Проверьте ключ и попробуйте снова.\n"
-                    error_msg += "Нажмите '🔑 API Ключ' для изменения."
-                elif response.status_code == 404:
-                    error_msg = f"❌ Модель недоступна.\n\n"
-                    error_msg += "Попробуйте позже или обратитесь в поддержку OpenRouter."
-                elif response.status_code == 402:
-                    error_msg = "❌ Недостаточно средств на балансе OpenRouter.\n\n"
-                    error_msg += "Пополните баланс на сайте openrouter.ai"
-
-                self.output_text.config(state=tk.NORMAL)
-                self.output_text.delete("1.0", tk.END)
-                self.output_text.insert(tk.END, error_msg)
-                self.output_text.config(state=tk.DISABLED)
+        self.update_budget_label()
 
+        try:
+            result = future.result()
+            self.status_label.config(text="✅ Готово", fg=self.success_green)
+            on_result(result)
+        except ApiError as e:
+            self.status_label.config(text="❌ Ошибка", fg=self.error_red)
+            self.show_api_error(e)
+        except BudgetExceededError as e:
+            self.status_label.config(text="💰 Лимит", fg=self.error_red)
+            messagebox.showwarning("💰 Бюджет", f"{e}.\n\nЛимиты задаются в config.json.")
         except requests.exceptions.Timeout:
             self.status_label.config(text="❌ Timeout", fg=self.error_red)
             messagebox.showerror("⏱️ Ошибка", "Превышено время ожидания ответа от сервера.")
@@ -739,9 +1940,313 @@ if __name__ == '__main__':
             self.status_label.config(text="❌ Ошибка", fg=self.error_red)
             messagebox.showerror("⚠️ Ошибка", f"Произошла ошибка: {str(e)}")
 
+    def prepare_review(self, text: str):
+        """Источник diff для ревью: вставленный diff или, при пустом редакторе, две ревизии git
+
+        Возвращает (diff, функция чтения новой версии файла) или None.
+        """
+        is_diff = bool(re.search(r'^@@ ', text, re.M))
+        if text and not is_diff:
+            messagebox.showwarning(
+                "Предупреждение",
+                "В редакторе не unified diff.\n\n"
+                "Вставьте diff или очистите поле, чтобы сравнить ревизии git репозитория."
+            )
+            return None
+
+        repo = filedialog.askdirectory(title="Каталог git репозитория")
+
+        if is_diff:
+            # Без репозитория анализируются только сами хунки
+            if not repo:
+                return text, lambda path: None
+            return text, lambda path: self.read_repo_file(repo, path)
+
+        if not repo:
+            return None
+        revisions = simpledialog.askstring(
+            "🔀 Ревизии",
+            "Диапазон ревизий (A..B) или одна ревизия для сравнения с рабочей копией:",
+            initialvalue="HEAD",
+            parent=self.root
+        )
+        if not revisions:
+            return None
+
+        try:
+            diff = subprocess.run(
+                ["git", "-C", repo, "diff", "--no-color", revisions, "--", "*.py"],
+                capture_output=True, text=True, encoding="utf-8", check=True
+            ).stdout
+        except (OSError, subprocess.CalledProcessError) as e:
+            messagebox.showerror("⚠️ Ошибка", f"Не удалось получить diff: {getattr(e, 'stderr', '') or e}")
+            return None
+
+        if '..' in revisions:
+            new_rev = revisions.split('..')[-1].lstrip('.') or "HEAD"
+            return diff, lambda path: self.read_repo_file(repo, path, new_rev)
+        return diff, lambda path: self.read_repo_file(repo, path)
+
+    @staticmethod
+    def read_repo_file(repo: str, path: str, revision: Optional[str] = None) -> Optional[str]:
+        """Новая версия файла: из ревизии git или из рабочей копии"""
+        try:
+            if revision:
+                return subprocess.run(
+                    ["git", "-C", repo, "show", f"{revision}:{path}"],
+                    capture_output=True, text=True, encoding="utf-8", check=True
+                ).stdout
+            with open(os.path.join(repo, path), 'r', encoding='utf-8') as f:
+                return f.read()
+        except (OSError, UnicodeDecodeError, subprocess.CalledProcessError):
+            return None
+
+    def apply_autofix(self, original: str, patched: str, applied: list, failed: list):
+        """Замена кода в редакторе на исправленный и вывод отчёта"""
+        report = f"🩹 Принято исправлений: {len(applied)}, отклонено: {len(failed)}\n\n"
+
+        if applied:
+            diff = difflib.unified_diff(
+                original.splitlines(), patched.splitlines(), "исходный", "исправленный", lineterm=""
+            )
+            report += "\n".join(diff) + "\n\n"
+
+            if self.code_input.get("1.0", tk.END).strip() == original:
+                self.code_input.edit_separator()
+                self.code_input.delete("1.0", tk.END)
+                self.code_input.insert("1.0", patched)
+                self.code_input.edit_separator()
+                report += "✅ Исправления применены к коду (Ctrl+Z — отмена).\n\n"
+            else:
+                report += "⚠️ Код изменён во время анализа — исправления не применены.\n\n"
+
+        for hunk, problems in failed:
+            report += "─" * 80 + "\n"
+            report += f"❌ {'; '.join(problems)}\n{hunk}\n\n"
+
+        self.show_report(AUTOFIX_MODE, report)
+
+    def show_report(self, analysis_type: str, content: str):
+        """Вывод отчёта в поле результата"""
+        self.output_text.config(state=tk.NORMAL)
+        self.output_text.delete("1.0", tk.END)
+
+        # Красивый заголовок отчёта
+        self.output_text.insert(tk.END, "╔" + "═" * 78 + "╗\n", "header")
+        self.output_text.insert(tk.END, "║" + " " * 20 + "РЕЗУЛЬТАТ АНАЛИЗА" + " " * 41 + "║\n", "header")
+        self.output_text.insert(tk.END, "╚" + "═" * 78 + "╝\n\n", "header")
+
+        self.output_text.insert(tk.END, f"📊 Тип: ", "bold")
+        self.output_text.insert(tk.END, f"{analysis_type}\n")
+        self.output_text.insert(tk.END, f"⚡ Модель: ", "bold")
+        self.output_text.insert(tk.END, "Mistral 7B Instruct\n")
+        self.output_text.insert(tk.END, "─" * 80 + "\n\n")
+
+        self.discard_report_file()
+        path = spill_report(content)
+        if path:
+            self.insert_report_preview(path)
+        else:
+            self.output_text.insert(tk.END, content)
+
+        # Стили для текста
+        self.output_text.tag_config("header", foreground=self.accent_cyan)
+        self.output_text.tag_config("bold", foreground=self.accent_purple, font=("Consolas", 10, "bold"))
+
+        self.output_text.config(state=tk.DISABLED)
+
+    def insert_report_preview(self, path: str):
+        """Вывод начала длинного отчёта; полный текст остаётся в файле"""
+        self.report_file = path
+        with open(path, 'r', encoding='utf-8') as f:
+            preview = f.read(REPORT_PREVIEW_CHARS)
+        self.output_text.insert(tk.END, preview)
+        self.output_text.insert(tk.END, f"\n\n… Отчёт слишком длинный. Полный текст: {path}\n", "bold")
+
+    def discard_report_file(self):
+        """Удаление временного файла предыдущего отчёта"""
+        if self.report_file:
+            try:
+                os.remove(self.report_file)
+            except OSError:
+                pass
+            self.report_file = None
+
+    def show_memory_report(self):
+        """Переключатель tracemalloc: первое нажатие включает, второе — отчёт и остановка"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            messagebox.showinfo("🧠 Память", "Отслеживание памяти запущено.\n"
+                                             "Нажмите кнопку ещё раз, чтобы увидеть отчёт.")
+            return
+
+        current, peak = tracemalloc.get_traced_memory()
+        rss = current_rss()
+        report = f"Выделено Python: {current / 1e6:.1f} МБ (пик {peak / 1e6:.1f} МБ)\n"
+        if rss is not None:
+            report += f"RSS процесса: {rss / 1e6:.1f} МБ\n"
+        report += f"Очередь планировщика: {self.scheduler.pending()}\n\n"
+        report += "Крупнейшие места выделения памяти:\n"
+
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__)
+        ])
+        for stat in snapshot.statistics('lineno')[:15]:
+            frame = stat.traceback[0]
+            report += f"  {stat.size / 1024:>10.1f} КБ  {stat.count:>7}  {frame.filename}:{frame.lineno}\n"
+
+        # Трассировка замедляет каждое выделение памяти — снимок сделан, выключаем
+        del snapshot
+        tracemalloc.stop()
+        report += "\nОтслеживание остановлено. Нажмите кнопку, чтобы запустить его снова.\n"
+        self.show_report("🧠 Память", report)
+
+    def show_api_error(self, error: ApiError):
+        """Вывод ошибки API в поле результата"""
+        error_msg = f"❌ ОШИБКА API: {error.status_code}\n\n"
+        error_msg += f"Сообщение: {error.message}\n"
+
+        if error.status_code == 401:
+            error_msg = "❌ Неверный API ключ.\n\n"
+            error_msg += "Проверьте ключ и попробуйте снова.\n"
+            error_msg += "Нажмите '🔑 API Ключ' для изменения."
+        elif error.status_code == 404:
+            error_msg = f"❌ Модель недоступна.\n\n"
+            error_msg += "Попробуйте позже или обратитесь в поддержку OpenRouter."
+        elif error.status_code == 402:
+            error_msg = "❌ Недостаточно средств на балансе OpenRouter.\n\n"
+            error_msg += "Пополните баланс на сайте openrouter.ai"
+
+        self.output_text.config(state=tk.NORMAL)
+        self.output_text.delete("1.0", tk.END)
+        self.output_text.insert(tk.END, error_msg)
+        self.output_text.config(state=tk.DISABLED)
+
+    def start_batch(self):
+        """Постановка всех .py файлов каталога в персистентную очередь"""
+        if not self.api_key:
+            messagebox.showerror("Ошибка", "API ключ не установлен!")
+            self.request_api_key()
+            return
+
+        folder = filedialog.askdirectory(title="Каталог для пакетного анализа")
+        if not folder:
+            return
+
+        analysis_type = self.analysis_type.get()
+        if analysis_type in (AUTOFIX_MODE, REVIEW_MODE):
+            # Автоисправление правит буфер редактора, ревью работает с diff —
+            # в пакете файлы проходят полный аудит
+            analysis_type = self.analysis_type['values'][0]
+
+        jobs = []
+        for dirpath, dirnames, filenames in os.walk(folder):
+            dirnames[:] = [d for d in dirnames if d not in SKIPPED_DIRS]
+            for filename in sorted(filenames):
+                if not filename.endswith('.py'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        code = f.read()
+                except (OSError, UnicodeDecodeError):
+                    continue
+                if code.strip():
+                    jobs.append((path, analysis_type, self.get_prompt(code, analysis_type)))
+
+        if not jobs:
+            messagebox.showwarning("Предупреждение", "В каталоге нет Python файлов!")
+            return
+
+        added = self.job_queue.enqueue(jobs, PRIORITY_BATCH)
+        self.batch_runner.start()
+        message = f"В очередь добавлено файлов: {added} из {len(jobs)}"
+        if added < len(jobs):
+            message += ("\n\nОстальные уже в очереди или проанализированы без изменений. "
+                        "Для повторного анализа очистите завершённые задания (меню «📑 Пакет»).")
+        messagebox.showinfo("📦 Пакетный анализ", message)
+
+    def retry_failed_batch(self):
+        """Возврат неудавшихся заданий в очередь"""
+        retried = self.job_queue.retry_failed()
+        if retried:
+            self.batch_runner.start()
+            messagebox.showinfo("🔁 Пакетный анализ", f"Повторно поставлено в очередь: {retried}")
+        else:
+            messagebox.showinfo("🔁 Пакетный анализ", "Неудавшихся заданий нет.")
+
+    def clear_finished_batch(self):
+        """Удаление завершённых и неудавшихся заданий вместе с результатами"""
+        stats = self.job_queue.stats()
+        finished = stats.get('done', 0) + stats.get('failed', 0)
+        if not finished:
+            messagebox.showinfo("🗑️ Пакетный анализ", "Завершённых заданий нет.")
+            return
+        if messagebox.askyesno("🗑️ Пакетный анализ", f"Удалить завершённые задания и их отчёты ({finished})?"):
+            self.job_queue.clear_finished()
+
+    def poll_batch(self):
+        """Периодическое обновление прогресса пакетного анализа"""
+        stats = self.job_queue.stats()
+        total = sum(stats.values())
+        if total:
+            text = f"📦 {stats.get('done', 0)}/{total}"
+            if stats.get('failed'):
+                text += f" · ❌ {stats['failed']}"
+            self.batch_label.config(text=text)
+        else:
+            self.batch_label.config(text="")
+        self.update_budget_label()
+        self.root.after(1000, self.poll_batch)
+
+    def show_batch_report(self):
+        """Вывод результатов пакетного анализа из очереди"""
+        size = 0
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', prefix='code_analyzer_',
+                                         suffix='.txt', delete=False) as f:
+            for job in self.job_queue.finished():
+                text = "═" * 80 + f"\n📄 {job['source']}\n" + "═" * 80 + "\n\n"
+                if job['state'] == 'done':
+                    text += job['result'] + "\n\n"
+                else:
+                    text += f"❌ {job['error']}\n\n"
+                f.write(text)
+                size += len(text)
+            path = f.name
+
+        if not size:
+            os.remove(path)
+            messagebox.showwarning("Предупреждение", "Нет завершённых заданий!")
+            return
+
+        self.discard_report_file()
+        self.output_text.config(state=tk.NORMAL)
+        self.output_text.delete("1.0", tk.END)
+
+        if size > REPORT_SPILL_CHARS:
+            self.insert_report_preview(path)
+        else:
+            os.remove(path)
+            for job in self.job_queue.finished():
+                self.output_text.insert(tk.END, "═" * 80 + "\n", "header")
+                self.output_text.insert(tk.END, f"📄 {job['source']}\n", "bold")
+                self.output_text.insert(tk.END, "═" * 80 + "\n\n", "header")
+                if job['state'] == 'done':
+                    self.output_text.insert(tk.END, job['result'] + "\n\n")
+                else:
+                    self.output_text.insert(tk.END, f"❌ {job['error']}\n\n")
+
+        self.output_text.tag_config("header", foreground=self.accent_cyan)
+        self.output_text.tag_config("bold", foreground=self.accent_purple, font=("Consolas", 10, "bold"))
+        self.output_text.config(state=tk.DISABLED)
+
     def copy_report(self):
         """Копирование отчёта в буфер обмена"""
-        report = self.output_text.get("1.0", tk.END).strip()
+        if self.report_file:
+            with open(self.report_file, 'r', encoding='utf-8') as f:
+                report = f.read()
+        else:
+            report = self.output_text.get("1.0", tk.END).strip()
         if report:
             self.root.clipboard_clear()
             self.root.clipboard_append(report)
@@ -752,6 +2257,7 @@ if __name__ == '__main__':
     def clear_all(self):
         """Очистка всех полей"""
         self.code_input.delete("1.0", tk.END)
+        self.discard_report_file()
         self.output_text.config(state=tk.NORMAL)
         self.output_text.delete("1.0", tk.END)
         self.output_text.config(state=tk.DISABLED)
@@ -761,6 +2267,9 @@ def main():
     root = tk.Tk()
     app = CodeAnalyzerApp(root)
     root.mainloop()
+    app.discard_report_file()
+    app.autofixer.close()
+    app.job_queue.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,134 @@
+from concurrent.futures import Future
+
+import pytest
+
+import code_analyzer as ca
+
+
+CODE = """def find_Maximum(List):
+    max_value = List[0]
+    return max_value
+
+
+def show():
+    print(find_Maximum([1, 2]))"""
+
+RENAME_DEF = """@@ -1,3 +1,3 @@
+-def find_Maximum(List):
+-    max_value = List[0]
++def find_maximum(values):
++    max_value = values[0]
+     return max_value"""
+
+RENAME_CALL = """@@ -6,2 +6,2 @@
+ def show():
+-    print(find_Maximum([1, 2]))
++    print(find_maximum([1, 2]))"""
+
+
+class FakeScheduler:
+    def __init__(self, replies):
+        self.replies = iter(replies)
+        self.prompts = []
+
+    def submit(self, prompt, priority):
+        self.prompts.append(prompt)
+        future = Future()
+        future.set_result({'choices': [{'message': {'content': next(self.replies, '')}}]})
+        return future
+
+
+def make_fixer(replies):
+    return ca.AutoFixer(FakeScheduler(replies), lambda code, analysis_type: code)
+
+
+def test_split_hunks_extracts_hunks_from_markdown():
+    reply = f"Исправления:\n```diff\n--- a\n+++ b\n{RENAME_DEF}\n\n{RENAME_CALL}\n```\nГотово."
+    assert ca.split_hunks(reply) == [RENAME_DEF, RENAME_CALL]
+
+
+def test_apply_hunk_finds_context_despite_wrong_line_numbers():
+    hunk = RENAME_CALL.replace("@@ -6,2 +6,2 @@", "@@ -40,2 +40,2 @@")
+    assert "print(find_maximum([1, 2]))" in ca.apply_hunk(CODE, hunk)
+
+
+def test_apply_hunk_rejects_missing_context():
+    with pytest.raises(ca.PatchError):
+        ca.apply_hunk(CODE, "@@ -1,1 +1,1 @@\n-nothing here\n+x = 1")
+
+
+def test_static_check_reports_undefined_names():
+    assert ca.static_check(CODE) == set()
+    assert ca.static_check(ca.apply_hunk(CODE, RENAME_DEF)) == {"Неопределённое имя find_Maximum"}
+    assert ca.static_check(ca.apply_hunk(CODE, RENAME_CALL)) == {"Неопределённое имя find_maximum"}
+
+
+def test_static_check_reports_syntax_error_and_duplicates():
+    assert ca.static_check("if x\n    pass") == {"SyntaxError: expected ':': if x"}
+    assert ca.static_check("def f():\n    pass\ndef f():\n    pass") == {"Повторное определение f"}
+
+
+def test_static_check_skips_names_after_star_import():
+    assert ca.static_check("from os.path import *\nprint(join)") == set()
+
+
+def test_settle_accepts_rename_spanning_two_hunks():
+    fixer = make_fixer([])
+    patched, accepted, rejected = fixer.settle_hunks(CODE, [RENAME_DEF, RENAME_CALL])
+    assert accepted == [RENAME_DEF, RENAME_CALL]
+    assert rejected == []
+    assert "find_Maximum" not in patched
+
+
+def test_settle_rolls_back_half_applied_rename():
+    fixer = make_fixer([])
+    patched, accepted, rejected = fixer.settle_hunks(CODE, [RENAME_CALL])
+    assert patched == CODE
+    assert accepted == []
+    assert rejected == [(RENAME_CALL, ["Неопределённое имя find_maximum"])]
+
+
+def test_settle_keeps_independent_hunks_when_one_is_rolled_back():
+    style = "@@ -6,1 +6,2 @@\n def show():\n+    \"\"\"Вывод максимума\"\"\""
+    fixer = make_fixer([])
+    try:
+        patched, accepted, rejected = fixer.settle_hunks(CODE, [style, RENAME_CALL])
+    finally:
+        fixer.close()
+    assert accepted == [style]
+    assert [hunk for hunk, _ in rejected] == [RENAME_CALL]
+    assert '"""Вывод максимума"""' in patched
+
+
+def test_settle_requires_broken_baseline_to_compile():
+    broken = CODE + "\nif True\n    pass"
+    fixer = make_fixer([])
+    patched, accepted, rejected = fixer.settle_hunks(broken, [RENAME_DEF, RENAME_CALL])
+    assert patched == broken
+    assert accepted == []
+    assert len(rejected) == 2
+
+    fix = "@@ -8,2 +8,2 @@\n-if True\n+if True:\n     pass"
+    patched, accepted, rejected = fixer.settle_hunks(broken, [fix])
+    assert accepted == [fix]
+    assert ca.static_check(patched) == set()
+
+
+def test_run_retries_only_rejected_hunks():
+    first = f"```diff\n{RENAME_CALL}\n```"
+    second = f"```diff\n{RENAME_DEF}\n\n{RENAME_CALL}\n```"
+    fixer = make_fixer([first, second])
+    patched, applied, rejected = fixer.run(CODE)
+    assert applied == [RENAME_DEF, RENAME_CALL]
+    assert rejected == []
+    assert RENAME_CALL in fixer.scheduler.prompts[1]
+
+
+def test_full_set_is_checked_in_spawned_process_pool():
+    fixer = make_fixer([])
+    try:
+        fixer.settle_hunks(CODE, [RENAME_DEF, RENAME_CALL])
+        assert fixer._pool is not None
+        assert fixer._pool._mp_context.get_start_method() == "spawn"
+    finally:
+        fixer.close()
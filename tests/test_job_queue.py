@@ -0,0 +1,161 @@
+import time
+from concurrent.futures import Future
+
+import pytest
+
+import code_analyzer as ca
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.sent = []
+
+    def submit(self, prompt, priority, before_send=None):
+        future = Future()
+        if before_send is not None and not before_send():
+            future.set_exception(ca.LeaseLostError())
+        else:
+            self.sent.append(prompt)
+            future.set_result({'choices': [{'message': {'content': 'ответ ' + prompt}}]})
+        return future
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "jobs.db")
+
+
+def crash(queue):
+    """Имитация падения процесса: отметки больше не обновляются"""
+    queue._closed.set()
+    with queue._lock:
+        queue._conn.execute("UPDATE processes SET seen = 0 WHERE id = ?", (queue.process_id,))
+
+
+def wait_for(queue, state, count, timeout=5):
+    deadline = time.time() + timeout
+    while queue.stats().get(state, 0) < count:
+        assert time.time() < deadline, queue.stats()
+        time.sleep(0.02)
+
+
+def test_enqueue_ignores_duplicates(db_path):
+    queue = ca.JobQueue(db_path)
+    assert queue.enqueue([("a.py", "t", "p1"), ("b.py", "t", "p2")]) == 2
+    assert queue.enqueue([("a.py", "t", "p1")]) == 0
+    queue.close()
+
+
+def test_jobs_of_dead_process_are_released_without_waiting_for_lease(db_path):
+    crashed = ca.JobQueue(db_path)
+    crashed.enqueue([("a.py", "t", "p1"), ("b.py", "t", "p2")])
+    owner = crashed.new_owner()
+    claimed = crashed.claim(owner)
+    sent = crashed.claim(owner)
+    assert crashed.mark_sent(sent['id'], owner)
+    crash(crashed)
+
+    queue = ca.JobQueue(db_path)
+    job = queue.claim(queue.new_owner())
+    assert job['id'] == claimed['id']
+    assert queue.stats() == {'claimed': 1, 'failed': 1}
+    assert not crashed.mark_sent(claimed['id'], owner)
+    queue.close()
+
+
+def test_live_process_keeps_its_claims(db_path):
+    first = ca.JobQueue(db_path)
+    first.enqueue([("a.py", "t", "p1")])
+    assert first.claim(first.new_owner()) is not None
+
+    second = ca.JobQueue(db_path)
+    assert second.claim(second.new_owner()) is None
+    first.close()
+    second.close()
+
+
+def test_runner_picks_up_jobs_added_after_going_idle(db_path):
+    queue = ca.JobQueue(db_path)
+    scheduler = FakeScheduler()
+    runner = ca.BatchRunner(queue, scheduler)
+    queue.enqueue([("a.py", "t", "p1")])
+    runner.start()
+    wait_for(queue, 'done', 1)
+
+    queue.enqueue([("b.py", "t", "p2")])
+    runner.start()
+    wait_for(queue, 'done', 2, timeout=ca.IDLE_POLL_SECONDS / 2)
+    assert sorted(scheduler.sent) == ["p1", "p2"]
+    queue.close()
+
+
+def test_retry_failed_and_clear_finished(db_path):
+    queue = ca.JobQueue(db_path)
+    queue.enqueue([("a.py", "t", "p1"), ("b.py", "t", "p2")])
+    owner = queue.new_owner()
+    first = queue.claim(owner)
+    queue.fail(first['id'], owner, "timeout")
+    second = queue.claim(owner)
+    queue.mark_sent(second['id'], owner)
+    queue.complete(second['id'], owner, "ok")
+
+    assert queue.retry_failed() == 1
+    assert queue.stats() == {'pending': 1, 'done': 1}
+
+    queue.clear_finished()
+    assert queue.enqueue([("b.py", "t", "p2")]) == 1
+    queue.close()
+
+
+def test_stalled_process_keeps_its_own_sent_jobs(db_path):
+    queue = ca.JobQueue(db_path)
+    queue.enqueue([("a.py", "t", "p1"), ("b.py", "t", "p2")])
+    owner = queue.new_owner()
+    job = queue.claim(owner)
+    assert queue.mark_sent(job['id'], owner)
+    # Сон ноутбука: отметка процесса устарела, аренда истекла
+    with queue._lock:
+        queue._conn.execute("UPDATE processes SET seen = 0")
+        queue._conn.execute("UPDATE jobs SET lease_until = 0 WHERE id = ?", (job['id'],))
+
+    queue.claim(queue.new_owner())
+    assert queue.complete(job['id'], owner, "оплаченный ответ")
+    assert queue.stats() == {'claimed': 1, 'done': 1}
+    queue.close()
+
+
+def test_late_response_is_kept_after_job_was_marked_failed(db_path):
+    slow = ca.JobQueue(db_path)
+    slow.enqueue([("a.py", "t", "p1")])
+    owner = slow.new_owner()
+    job = slow.claim(owner)
+    slow.mark_sent(job['id'], owner)
+    with slow._lock:
+        slow._conn.execute("UPDATE jobs SET lease_until = 0")
+
+    other = ca.JobQueue(db_path)
+    assert other.claim(other.new_owner()) is None
+    assert other.stats() == {'failed': 1}
+
+    assert slow.complete(job['id'], owner, "ответ")
+    assert [row['result'] for row in other.finished()] == ["ответ"]
+    slow.close()
+    other.close()
+
+
+def test_runner_survives_locked_database(db_path, monkeypatch):
+    monkeypatch.setattr(ca, "IDLE_POLL_SECONDS", 0.05)
+    queue = ca.JobQueue(db_path)
+    queue.enqueue([("a.py", "t", "p1")])
+    claim = queue.claim
+    failures = iter([True, True])
+
+    def flaky_claim(owner):
+        if next(failures, False):
+            raise ca.sqlite3.OperationalError("database is locked")
+        return claim(owner)
+
+    monkeypatch.setattr(queue, "claim", flaky_claim)
+    ca.BatchRunner(queue, FakeScheduler(), workers=1).start()
+    wait_for(queue, 'done', 1)
+    queue.close()
@@ -0,0 +1,122 @@
+import json
+import os
+import threading
+import tkinter as tk
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import code_analyzer as ca
+
+
+ITERATIONS = 1000
+WARMUP = 100
+# Допустимый рост после прогрева
+TRACED_GROWTH_LIMIT = 2 * 1024 * 1024
+RSS_GROWTH_LIMIT = 30 * 1024 * 1024
+
+CODE = "def f(x):\n    return x\n" * 200
+
+
+@pytest.fixture(scope="module")
+def api_url():
+    """Локальный сервер с ответом в формате OpenRouter; отчёт длиннее порога выгрузки"""
+    body = json.dumps({
+        'choices': [{'message': {'content': "Строка 1: замечание\n" * (ca.REPORT_SPILL_CHARS // 10)}}],
+        'usage': {'total_tokens': 1000}
+    }).encode('utf-8')
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/"
+    server.shutdown()
+
+
+def run_soak(analyze):
+    """Прогон анализов с замером роста traced-памяти и RSS после прогрева"""
+    tracemalloc.start()
+    try:
+        for i in range(ITERATIONS):
+            analyze(i)
+            if i + 1 == WARMUP:
+                traced_before = tracemalloc.get_traced_memory()[0]
+                rss_before = ca.current_rss()
+        traced_growth = tracemalloc.get_traced_memory()[0] - traced_before
+        rss_after = ca.current_rss()
+    finally:
+        tracemalloc.stop()
+
+    assert traced_growth < TRACED_GROWTH_LIMIT, f"traced: +{traced_growth / 1e6:.1f} МБ"
+    if rss_before is not None and rss_after is not None:
+        rss_growth = rss_after - rss_before
+        assert rss_growth < RSS_GROWTH_LIMIT, f"RSS: +{rss_growth / 1e6:.1f} МБ"
+
+
+def test_post_completion_reads_body_larger_than_spool(api_url):
+    result = ca.post_completion(api_url, "key", "model", "prompt")
+    content = result['choices'][0]['message']['content']
+    # json.dumps экранирует кириллицу, тело на проводе больше порога буфера
+    assert len(json.dumps(content)) > ca.RESPONSE_SPOOL_BYTES
+    assert content == "Строка 1: замечание\n" * (ca.REPORT_SPILL_CHARS // 10)
+    assert result['usage'] == {'total_tokens': 1000}
+
+
+def test_analysis_pipeline_memory_stays_flat(api_url):
+    scheduler = ca.AnalysisScheduler(
+        lambda prompt: ca.post_completion(api_url, "key", "model", prompt),
+        ca.TokenBudget(0, 0),
+        ca.SCHEDULER_WORKERS
+    )
+
+    def analyze(i):
+        result = scheduler.submit(CODE, ca.PRIORITY_INTERACTIVE).result()
+        path = ca.spill_report(result['choices'][0]['message']['content'])
+        assert path is not None
+        os.remove(path)
+
+    run_soak(analyze)
+
+
+def test_ui_memory_stays_flat(api_url, tmp_path, monkeypatch):
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        pytest.skip("Нет дисплея для Tk")
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ca, "OPENROUTER_URL", api_url)
+    with open("config.json", "w") as f:
+        json.dump({'api_key': "key", 'tokens_per_minute': 0, 'tokens_per_day': 0}, f)
+
+    app = ca.CodeAnalyzerApp(root)
+    analysis_type = app.analysis_type['values'][0]
+
+    def analyze(i):
+        app.code_input.insert(tk.END, f"x{i} = {i}\n")
+        code = app.code_input.get("1.0", tk.END)
+        result = app.scheduler.submit(app.get_prompt(code, analysis_type)).result()
+        app.show_report(analysis_type, result['choices'][0]['message']['content'])
+        root.update()
+
+    try:
+        run_soak(analyze)
+        assert app.report_file is not None
+        assert len(app.output_text.get("1.0", tk.END)) < ca.REPORT_PREVIEW_CHARS + 1000
+    finally:
+        app.discard_report_file()
+        app.autofixer.close()
+        app.job_queue.close()
+        root.destroy()
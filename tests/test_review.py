@@ -0,0 +1,127 @@
+import code_analyzer as ca
+
+
+def make_source():
+    lines = ["import os", "import sys", "", "A = 1", "B = 2", "C = 3", "D = 4", ""]
+    lines += ["class Big:", "    \"\"\"Большой класс\"\"\"", "    limit = 10", ""]
+    for i in range(30):
+        lines += [f"    def m{i}(self):", f"        return {i}", ""]
+    lines += ["def tail(x):", "    return x", ""]
+    return "\n".join(lines)
+
+
+def make_diff(hunks):
+    return "diff --git a/m.py b/m.py\n--- a/m.py\n+++ b/m.py\n" + "\n".join(hunks) + "\n"
+
+
+SOURCE = make_source()
+LINES = SOURCE.split("\n")
+
+
+def read(path):
+    return SOURCE if path == "m.py" else None
+
+
+def collect(diff):
+    return ca.DiffReviewer(None, None).collect_scopes(diff, read)
+
+
+def test_parse_diff_files_reads_paths_and_new_ranges():
+    diff = make_diff(["@@ -4,2 +4,3 @@", " A = 1", "+A2 = 1", " B = 2"])
+    diff += "--- a/README.md\n+++ b/README.md\n@@ -1 +1 @@\n-x\n+y\n"
+    files = ca.parse_diff_files(diff)
+    assert [path for path, _ in files] == ["m.py"]
+    assert [(start, length) for start, length, _ in files[0][1]] == [(4, 3)]
+
+
+def test_parse_diff_files_uses_header_counts_for_hunk_end():
+    diff = make_diff(["@@ -1 +1 @@", "-import os", "+import os, re", "@@ -5,0 +6,1 @@", "+E = 5"])
+    hunks = ca.parse_diff_files(diff)[0][1]
+    assert [(start, length) for start, length, _ in hunks] == [(1, 1), (6, 1)]
+
+
+def test_hunk_changed_lines_skips_blank_and_comment_lines():
+    hunk = "@@ -1,4 +1,5 @@\n x = 1\n+\n+# комментарий\n+y = 2\n-z = 3\n w = 4"
+    assert ca.hunk_changed_lines(1, hunk) == [4, 5]
+
+
+def test_hunk_changed_lines_ignores_removed_blank_lines():
+    hunk = "@@ -1,3 +1,2 @@\n x = 1\n-\n y = 2"
+    assert ca.hunk_changed_lines(1, hunk) == []
+
+
+def test_method_change_sends_only_the_method():
+    lineno = LINES.index("        return 5") + 1
+    diff = make_diff([f"@@ -{lineno},1 +{lineno},1 @@", "-        return 0", "+        return 5"])
+    scopes = collect(diff)
+    assert len(scopes) == 1
+    assert scopes[0][3] == 2
+
+
+def test_class_level_change_sends_header_and_window_not_whole_class():
+    lineno = LINES.index("    limit = 10") + 1
+    diff = make_diff([f"@@ -{lineno},1 +{lineno},1 @@", "-    limit = 5", "+    limit = 10"])
+    scopes = collect(diff)
+    assert len(scopes) == 1
+    assert scopes[0][3] <= 1 + 2 * ca.REVIEW_CONTEXT_LINES + 1
+    assert "class Big:" in scopes[0][2]
+
+
+def test_blank_line_change_between_methods_sends_nothing():
+    lineno = LINES.index("    def m3(self):")
+    diff = make_diff([f"@@ -{lineno},0 +{lineno},1 @@", "+"])
+    assert collect(diff) == []
+
+
+def test_adjacent_module_level_changes_share_one_request():
+    hunk = ["@@ -4,4 +4,4 @@", "-A = 0", "-B = 0", "-C = 0", "-D = 0", "+A = 1", "+B = 2", "+C = 3", "+D = 4"]
+    scopes = collect(make_diff(hunk))
+    assert len(scopes) == 1
+    assert scopes[0][3] == 4 + 2 * ca.REVIEW_CONTEXT_LINES
+
+
+def test_long_function_sends_signature_and_window():
+    body = ["def long():"] + [f"    x{i} = {i}" for i in range(200)] + ["    return x0", ""]
+    source = "\n".join(body)
+    diff = "--- a/l.py\n+++ b/l.py\n@@ -101,1 +101,1 @@\n-    x99 = 0\n+    x99 = 99\n"
+    scopes = ca.DiffReviewer(None, None).collect_scopes(diff, lambda path: source)
+    assert len(scopes) == 1
+    assert scopes[0][3] == 1 + 2 * ca.REVIEW_CONTEXT_LINES + 1
+    assert "def long():" in scopes[0][2]
+
+
+def test_without_source_hunk_itself_is_sent():
+    diff = make_diff(["@@ -4,1 +4,1 @@", "-A = 0", "+A = 1"])
+    scopes = ca.DiffReviewer(None, None).collect_scopes(diff, lambda path: None)
+    assert len(scopes) == 1
+    assert scopes[0][2] == "    4> A = 1"
+
+
+def test_module_window_does_not_repeat_function_lines():
+    source = "def f():\n    return 1\nx = f()\n"
+    diff = "--- /dev/null\n+++ b/n.py\n@@ -0,0 +1,3 @@\n+def f():\n+    return 1\n+x = f()\n"
+    scopes = ca.DiffReviewer(None, None).collect_scopes(diff, lambda path: source)
+    sent = [line.split()[0] for _, _, snippet, _ in scopes for line in snippet.split("\n")]
+    assert len(sent) == len(set(sent))
+    assert sum(size for *_, size in scopes) == 4
+
+
+def test_class_window_does_not_repeat_changed_method():
+    lineno = LINES.index("    limit = 10") + 1
+    method = LINES.index("    def m0(self):") + 1
+    diff = make_diff([
+        f"@@ -{lineno},1 +{lineno},1 @@", "-    limit = 5", "+    limit = 10",
+        f"@@ -{method + 1},1 +{method + 1},1 @@", "-        return 1", "+        return 0",
+    ])
+    scopes = collect(diff)
+    assert len(scopes) == 2
+    sent = [line.split()[0] for _, _, snippet, _ in scopes for line in snippet.split("\n") if "⋮" not in line]
+    assert len(sent) == len(set(sent))
+
+
+def test_deletion_at_end_of_file_is_reviewed():
+    source = "def f():\n    return 1"
+    diff = ("--- a/e.py\n+++ b/e.py\n@@ -1,4 +1,2 @@\n def f():\n     return 1\n"
+            "-if __name__ == '__main__':\n-    f()\n")
+    scopes = ca.DiffReviewer(None, None).collect_scopes(diff, lambda path: source)
+    assert len(scopes) == 1
@@ -0,0 +1,103 @@
+import threading
+
+import pytest
+import requests
+
+import code_analyzer as ca
+
+
+def reply(tokens):
+    return {'choices': [{'message': {'content': 'ok'}}], 'usage': {'total_tokens': tokens}}
+
+
+def test_interactive_jobs_run_before_queued_batch_jobs():
+    started = threading.Event()
+    release = threading.Event()
+    order = []
+
+    def send(prompt):
+        order.append(prompt)
+        if prompt == "first":
+            started.set()
+            release.wait(5)
+        return reply(1)
+
+    scheduler = ca.AnalysisScheduler(send, ca.TokenBudget(0, 0), workers=1)
+    first = scheduler.submit("first", ca.PRIORITY_BATCH)
+    assert started.wait(5)
+
+    batch = [scheduler.submit(f"batch{i}", ca.PRIORITY_BATCH) for i in range(3)]
+    speculative = scheduler.submit("speculative", ca.PRIORITY_SPECULATIVE)
+    interactive = scheduler.submit("interactive", ca.PRIORITY_INTERACTIVE)
+    release.set()
+
+    for future in [first, interactive, speculative] + batch:
+        future.result(5)
+    assert order == ["first", "interactive", "batch0", "batch1", "batch2", "speculative"]
+
+
+def test_batch_is_throttled_at_80_percent_of_minute_budget():
+    budget = ca.TokenBudget(per_minute=10000, per_day=0)
+    entry, delay = budget.try_reserve(7000, ca.PRIORITY_INTERACTIVE, now=1000.0)
+    assert entry is not None and delay == 0
+
+    entry, delay = budget.try_reserve(1500, ca.PRIORITY_BATCH, now=1010.0)
+    assert entry is None
+    assert delay == pytest.approx(50.0)
+
+    entry, delay = budget.try_reserve(1500, ca.PRIORITY_INTERACTIVE, now=1010.0)
+    assert entry is not None
+
+    # Через минуту крупный расход выходит из окна
+    entry, delay = budget.try_reserve(1500, ca.PRIORITY_BATCH, now=1061.0)
+    assert entry is not None
+
+
+def test_scheduler_holds_batch_while_interactive_gets_through():
+    budget = ca.TokenBudget(per_minute=10000, per_day=0)
+    budget.try_reserve(7000, ca.PRIORITY_INTERACTIVE)
+    scheduler = ca.AnalysisScheduler(lambda prompt: reply(100), budget, workers=2)
+
+    batch = scheduler.submit("b" * 4000, ca.PRIORITY_BATCH)
+    interactive = scheduler.submit("i" * 4000, ca.PRIORITY_INTERACTIVE)
+
+    assert interactive.result(5)['usage']['total_tokens'] == 100
+    assert not batch.done()
+    batch.cancel()
+
+
+def test_interactive_job_fails_when_daily_budget_is_exhausted():
+    budget = ca.TokenBudget(per_minute=0, per_day=5000)
+    budget.try_reserve(4500, ca.PRIORITY_INTERACTIVE)
+    with pytest.raises(ca.BudgetExceededError):
+        budget.try_reserve(1024, ca.PRIORITY_INTERACTIVE)
+
+    scheduler = ca.AnalysisScheduler(lambda prompt: reply(1), budget, workers=1)
+    with pytest.raises(ca.BudgetExceededError):
+        scheduler.submit("x", ca.PRIORITY_INTERACTIVE).result(5)
+
+
+def test_settle_replaces_estimate_with_reported_usage():
+    budget = ca.TokenBudget(0, 0)
+    scheduler = ca.AnalysisScheduler(lambda prompt: reply(42), budget, workers=1)
+    prompt = "x" * 40000
+    assert budget.estimate_tokens(prompt) > 42
+
+    scheduler.submit(prompt).result(5)
+    assert budget.usage() == (42, 42)
+
+
+@pytest.mark.parametrize("error", [
+    ca.ApiError(500, "server"),
+    requests.exceptions.ConnectionError("offline"),
+    requests.exceptions.Timeout("slow"),
+])
+def test_reservation_is_refunded_when_send_fails(error):
+    def send(prompt):
+        raise error
+
+    budget = ca.TokenBudget(0, 0)
+    scheduler = ca.AnalysisScheduler(send, budget, workers=1)
+    with pytest.raises(type(error)):
+        scheduler.submit("x" * 4000).result(5)
+    assert budget.usage() == (0, 0)